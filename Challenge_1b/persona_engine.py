@@ -1,83 +1,147 @@
 import os
 import json
+import hashlib
+import heapq
+import re
 import fitz  # PyMuPDF
+import orjson
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Optional
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# On-disk result cache so unchanged PDFs skip re-parsing on repeat runs.
+# Bump CACHE_VERSION whenever the processing logic changes.
+CACHE_VERSION = 1
+CACHE_DIR = Path(os.environ.get("PDF_CACHE_DIR", Path.home() / ".cache" / "persona_engine"))
+MIN_CACHE_SIZE = 32 * 1024  # below this, parsing is cheaper than hashing
+
+# Pages whose first chunk has no keyword hits are screened out before
+# full-text normalization and scoring
+PREFIX_CHECK_CHARS = 1024
+
+def _cache_file_for(data: bytes, keywords: List[str], max_text_length: int) -> Optional[Path]:
+    """Return the cache file for a (PDF bytes, keywords, settings) combination, or None."""
+    if len(data) < MIN_CACHE_SIZE:
+        return None
+    digest = hashlib.sha1(data)
+    digest.update(" ".join(keywords).encode("utf-8"))
+    digest.update(str(max_text_length).encode("utf-8"))
+    return CACHE_DIR / f"{digest.hexdigest()}-v{CACHE_VERSION}.json"
+
 class PDFDocumentProcessor:
     """Process PDF documents to extract relevant sections based on persona and task."""
     
     def __init__(self, max_sections: int = 5, max_text_length: int = 500):
         self.max_sections = max_sections
         self.max_text_length = max_text_length
-    
+        self._keyword_pattern = None
+        self._keyword_ids = None
+        self._keyword_key = None
+
+    def _compile_keywords(self, keywords: List[str]) -> Tuple[re.Pattern, Dict[str, int]]:
+        """Build (and cache) an alternation regex plus a keyword-to-bit mapping."""
+        key = tuple(keywords)
+        if key != self._keyword_key:
+            # Longest-first alternation so a keyword that contains another
+            # still registers as itself
+            distinct = sorted(dict.fromkeys(keywords), key=len, reverse=True)
+            self._keyword_pattern = re.compile(
+                "|".join(map(re.escape, distinct)), re.IGNORECASE
+            )
+            self._keyword_ids = {kw.casefold(): i for i, kw in enumerate(distinct)}
+            self._keyword_key = key
+        return self._keyword_pattern, self._keyword_ids
+
     def calculate_relevance_score(self, text: str, keywords: List[str]) -> int:
         """
-        Calculate relevance score based on keyword frequency in text.
-        
+        Calculate relevance score based on distinct keywords present in text.
+
         Args:
             text: Text content to score
             keywords: List of keywords to search for
-            
+
         Returns:
             Integer score representing relevance
         """
-        text_lower = text.lower()
-        return sum(1 for keyword in keywords if keyword in text_lower)
+        if not keywords:
+            return 0
+        # One O(N) scan over the text instead of one substring search per
+        # keyword; each hit sets the keyword's bit, so the score is the
+        # popcount of distinct keywords seen
+        pattern, keyword_ids = self._compile_keywords(keywords)
+        mask = 0
+        for match in pattern.finditer(text):
+            # IGNORECASE can match characters whose folded form is not the
+            # keyword itself (e.g. U+017F for 's'); skip those rather than
+            # raising KeyError
+            idx = keyword_ids.get(match.group().casefold())
+            if idx is not None:
+                mask |= 1 << idx
+        return mask.bit_count()
     
-    def extract_page_text(self, page) -> str:
+    def normalize_page_text(self, raw_text: str) -> str:
         """
-        Extract clean text from a PDF page.
-        
+        Normalize raw page text for scoring and output.
+
         Args:
-            page: PyMuPDF page object
-            
+            raw_text: Text as returned by page.get_text("text")
+
         Returns:
-            Extracted text as string
+            Text with whitespace collapsed to single spaces
         """
-        text_blocks = []
-        blocks = page.get_text("dict")["blocks"]
-        
-        for block in blocks:
-            if block["type"] == 0:  # Text block
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        text_blocks.append(span["text"])
-        
-        return " ".join(text_blocks)
+        return " ".join(raw_text.split())
     
-    def process_pdf_document(self, pdf_path: Path, keywords: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    def process_pdf_document(self, pdf_path: Path, keywords: List[str],
+                             data: Optional[bytes] = None) -> Tuple[List[Dict], List[Dict]]:
         """
         Process a single PDF document to extract relevant sections.
-        
+
         Args:
             pdf_path: Path to PDF file
             keywords: List of keywords for relevance scoring
-            
+            data: Optional pre-read bytes of the PDF file
+
         Returns:
             Tuple of (relevant_sections, detailed_subsections)
         """
-        if not pdf_path.exists():
+        if data is None and not pdf_path.exists():
             logger.warning(f"PDF file not found: {pdf_path}")
             return [], []
-        
+
         try:
-            doc = fitz.open(pdf_path)
+            if data is not None:
+                doc = fitz.open(stream=data, filetype="pdf")
+            else:
+                doc = fitz.open(pdf_path)
             relevant_sections = []
             detailed_subsections = []
             filename = pdf_path.name
             
             for page_num, page in enumerate(doc, start=1):
-                page_text = self.extract_page_text(page)
-                
-                if not page_text.strip():
+                # Build the TextPage explicitly so every consumer below shares
+                # one extraction; a second get_text call would rebuild it
+                textpage = page.get_textpage()
+                raw_text = textpage.extractText()
+                textpage = None  # Release MuPDF resources promptly
+
+                # Cheap prefix screen: a page that fits entirely in the prefix
+                # and scores zero there can never pass the threshold below
+                prefix = raw_text[:PREFIX_CHECK_CHARS]
+                if (len(raw_text) <= PREFIX_CHECK_CHARS and
+                        self.calculate_relevance_score(prefix, keywords) == 0):
                     continue
-                
+
+                page_text = self.normalize_page_text(raw_text)
+
+                if not page_text:
+                    continue
+
                 relevance_score = self.calculate_relevance_score(page_text, keywords)
                 
                 if relevance_score > 1:
@@ -130,8 +194,8 @@ class PDFDocumentProcessor:
             results: Results dictionary to save
         """
         try:
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
+            with open(output_path, "wb") as f:
+                f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
             logger.info(f"Results saved to {output_path}")
         except Exception as e:
             logger.error(f"Error saving results to {output_path}: {str(e)}")
@@ -167,6 +231,44 @@ class PDFDocumentProcessor:
         
         return valid_paths
 
+    def _output_is_current(self, output_file: Path, subsections_file: Path,
+                           config_file: Path, pdf_directory: Path,
+                           document_list: List[Dict]) -> bool:
+        """
+        Check whether both output files are newer than the config and all PDFs.
+
+        Args:
+            output_file: Path to the collection output JSON
+            subsections_file: Path to the NDJSON subsections sidecar
+            config_file: Path to the collection config JSON
+            pdf_directory: Directory containing the collection PDFs
+            document_list: Document entries from the config
+
+        Returns:
+            True when both outputs exist and no input changed since they were written
+        """
+        if not output_file.exists() or not subsections_file.exists():
+            return False
+
+        try:
+            newest_input = max(
+                [config_file.stat().st_mtime] +
+                [(pdf_directory / doc_info["filename"]).stat().st_mtime
+                 for doc_info in document_list]
+            )
+        except OSError:
+            # A listed PDF is missing; reprocess so the usual warnings fire
+            return False
+
+        # A successful run publishes the sidecar before the primary JSON, so
+        # a sidecar newer than the JSON marks an interrupted run
+        output_mtime = output_file.stat().st_mtime
+        sidecar_mtime = subsections_file.stat().st_mtime
+        if sidecar_mtime > output_mtime:
+            return False
+
+        return sidecar_mtime > newest_input
+
     def process_document_collection(self, collection_path: Path) -> None:
         """
         Process a collection of PDF documents.
@@ -179,6 +281,8 @@ class PDFDocumentProcessor:
         # Setup paths
         config_file = collection_path / "challenge1b_input.json"
         output_file = collection_path / "challenge1b_output.json"
+        subsections_file = output_file.with_suffix(".subs.ndjson")
+        subsections_tmp = subsections_file.with_name(subsections_file.name + ".tmp")
         pdf_directory = collection_path / "PDFs"
         
         try:
@@ -190,28 +294,44 @@ class PDFDocumentProcessor:
             task_description = config_data["job_to_be_done"]["task"]
             document_list = config_data["documents"]
             
+            # Skip the collection when the output is newer than every input
+            if self._output_is_current(output_file, subsections_file, config_file,
+                                       pdf_directory, document_list):
+                logger.info(f"Output up to date for {collection_path.name}, skipping")
+                return
+
             # Generate keywords for relevance scoring
             combined_keywords = f"{persona_role} {task_description}".lower().split()
             
-            # Process all documents
+            # Process all documents in parallel (one worker per core),
+            # streaming subsections to an NDJSON sidecar as results arrive so
+            # they never accumulate in memory
             all_relevant_sections = []
-            all_detailed_subsections = []
-            processed_documents = []
-            
-            for doc_info in document_list:
-                pdf_path = pdf_directory / doc_info["filename"]
-                processed_documents.append(doc_info["filename"])
-                
-                sections, subsections = self.process_pdf_document(pdf_path, combined_keywords)
-                all_relevant_sections.extend(sections)
-                all_detailed_subsections.extend(subsections)
+            subsection_count = 0
+            processed_documents = [doc_info["filename"] for doc_info in document_list]
+            pdf_paths = [pdf_directory / filename for filename in processed_documents]
+
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+                    open(subsections_tmp, "wb") as subs_out:
+                results = executor.map(
+                    process_pdf_document,
+                    pdf_paths,
+                    repeat(combined_keywords),
+                    repeat(self.max_text_length)
+                )
+
+                for sections, subsections in results:
+                    all_relevant_sections.extend(sections)
+                    for subsection in subsections:
+                        subs_out.write(orjson.dumps(subsection) + b"\n")
+                    subsection_count += len(subsections)
             
-            # Sort by importance and limit results
-            top_sections = sorted(
-                all_relevant_sections, 
-                key=lambda x: x["importance_rank"], 
-                reverse=True
-            )[:self.max_sections]
+            # Select the top sections without sorting the full list
+            top_sections = heapq.nlargest(
+                self.max_sections,
+                all_relevant_sections,
+                key=lambda x: x["importance_rank"]
+            )
             
             # Prepare output
             processing_results = {
@@ -221,15 +341,59 @@ class PDFDocumentProcessor:
                     "job_to_be_done": task_description
                 },
                 "extracted_sections": top_sections,
-                "subsection_analysis": all_detailed_subsections
+                "subsection_analysis_file": subsections_file.name,
+                "subsection_count": subsection_count
             }
             
-            # Save results
+            # Publish the sidecar first, then the primary JSON; the freshness
+            # guard treats a sidecar newer than the JSON as an interrupted run
+            subsections_tmp.replace(subsections_file)
             self.save_results(output_file, processing_results)
-            
+
         except Exception as e:
             logger.error(f"Error processing collection {collection_path.name}: {str(e)}")
             raise
+        finally:
+            subsections_tmp.unlink(missing_ok=True)
+
+def process_pdf_document(pdf_path: Path, keywords: List[str],
+                         max_text_length: int = 500) -> Tuple[List[Dict], List[Dict]]:
+    """Top-level worker so a single PDF can be processed in a pool worker."""
+    # One sequential read serves both the cache hash and MuPDF parsing
+    try:
+        data = pdf_path.read_bytes()
+    except OSError:
+        logger.warning(f"PDF file not found: {pdf_path}")
+        return [], []
+
+    cache_file = _cache_file_for(data, keywords, max_text_length)
+    if cache_file is not None and cache_file.exists():
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                sections, subsections = json.load(f)
+            # The cache key is content-only, so re-attach the path-derived
+            # document name: a byte-identical file under another name must
+            # not inherit the original's filename
+            for section in sections:
+                section["document"] = pdf_path.name
+            for subsection in subsections:
+                subsection["document"] = pdf_path.name
+            return sections, subsections
+        except (OSError, json.JSONDecodeError, ValueError):
+            pass  # Corrupt cache entry; fall through to reprocess
+
+    processor = PDFDocumentProcessor(max_text_length=max_text_length)
+    sections, subsections = processor.process_pdf_document(pdf_path, keywords, data)
+
+    if cache_file is not None:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump([sections, subsections], f, ensure_ascii=False)
+        except OSError:
+            pass  # Caching is best-effort
+
+    return sections, subsections
 
 def main():
     """Main function to process all document collections."""